@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import List, Optional, Any
+from typing import Iterator, List, Optional, Any
 from functools import partial
 from os import cpu_count
 from concurrent.futures import ThreadPoolExecutor
@@ -15,6 +15,10 @@ from autoflow.configs.knowledge_base import IndexMethod
 from autoflow.data_types import DataType, guess_datatype
 from autoflow.knowledge_base.prompts import QA_WITH_KNOWLEDGE_PROMPT_TEMPLATE
 from autoflow.knowledge_graph.index import KnowledgeGraphIndex
+from autoflow.knowledge_graph.programs.cache import (
+    ExtractionCache,
+    SemanticExtractionCache,
+)
 from autoflow.loaders.base import Loader
 from autoflow.loaders.helper import get_loader_for_datatype
 from autoflow.models.llms import LLM
@@ -26,6 +30,23 @@ from autoflow.storage.doc_store import DocumentSearchResult, Document
 
 logger = logging.getLogger(__name__)
 
+# The max number of chunks to embed and insert in one batch when adding documents.
+DEFAULT_INSERT_BATCH_SIZE = 256
+
+
+def _batch_documents(
+    documents: List[Document], batch_size: int
+) -> Iterator[List[Document]]:
+    batch, num_chunks = [], 0
+    for document in documents:
+        batch.append(document)
+        num_chunks += len(document.chunks or [])
+        if num_chunks >= batch_size:
+            yield batch
+            batch, num_chunks = [], 0
+    if batch:
+        yield batch
+
 
 class KnowledgeBase(BaseComponent):
     _llm: LLM = PrivateAttr()
@@ -45,6 +66,8 @@ class KnowledgeBase(BaseComponent):
         embedding_model: Optional[EmbeddingModel] = None,
         rerank_model: Optional[RerankModel] = None,
         max_workers: Optional[int] = None,
+        extraction_cache: Optional[ExtractionCache] = None,
+        semantic_extraction_cache: Optional[SemanticExtractionCache] = None,
     ):
         super().__init__(
             namespace=namespace,
@@ -56,6 +79,8 @@ class KnowledgeBase(BaseComponent):
         self._llm = llm
         self._embedding_model = embedding_model
         self._reranker_model = rerank_model
+        self._extraction_cache = extraction_cache
+        self._semantic_extraction_cache = semantic_extraction_cache
         self._init_stores()
         self._init_indexes()
         self._max_workers = max_workers or cpu_count()
@@ -83,6 +108,8 @@ class KnowledgeBase(BaseComponent):
             kg_store=self._kg_store,
             dspy_lm=self._dspy_lm,
             embedding_model=self._embedding_model,
+            extraction_cache=self._extraction_cache,
+            semantic_extraction_cache=self._semantic_extraction_cache,
         )
 
     def class_name(self):
@@ -100,6 +127,7 @@ class KnowledgeBase(BaseComponent):
         data_type: Optional[DataType] = None,
         loader: Optional[Loader] = None,
         chunker: Optional[Chunker] = None,
+        insert_batch_size: int = DEFAULT_INSERT_BATCH_SIZE,
     ) -> List[Document]:
         if data_type is None:
             data_type = guess_datatype(source)
@@ -110,16 +138,33 @@ class KnowledgeBase(BaseComponent):
             loader = get_loader_for_datatype(data_type)
 
         with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
-            build_index_for_document = partial(
-                self.build_index_for_document, chunker=chunker
+            chunk_document = partial(self._chunk_document, chunker=chunker)
+            chunked_documents = list(executor.map(chunk_document, loader.load(source)))
+
+        # Add the documents in bulk, so that the chunks of many documents share
+        # one embedding request and one insert, instead of one per document.
+        for batch in _batch_documents(chunked_documents, insert_batch_size):
+            self.add_documents(batch)
+
+        if IndexMethod.KNOWLEDGE_GRAPH in self.index_methods:
+            self._kg_index.add_chunks(
+                [chunk for doc in chunked_documents for chunk in doc.chunks or []],
+                max_workers=self._max_workers,
             )
 
-            results = executor.map(build_index_for_document, loader.load(source))
+        return chunked_documents
 
-        return_documents = []
-        for result in results:
-            return_documents.append(result)
-        return return_documents
+    def _chunk_document(
+        self, document: Document, chunker: Optional[Chunker] = None
+    ) -> Document:
+        if chunker is None:
+            chunker = get_chunker_for_datatype(document.data_type)
+        chunked_document = chunker.chunk(document)
+        # The chunkers only fill in the text, link the chunks to their document, so
+        # that the knowledge graph records where the relationships come from.
+        for chunk in chunked_document.chunks or []:
+            chunk.document_id = chunked_document.id
+        return chunked_document
 
     def build_index_for_document(
         self,
@@ -137,20 +182,13 @@ class KnowledgeBase(BaseComponent):
             A list of documents that are the result of indexing the original document.
         """
         # TODO: handle duplicate documents.
-        if chunker is None:
-            chunker = get_chunker_for_datatype(document.data_type)
-
-        chunked_document = chunker.chunk(document)
+        chunked_document = self._chunk_document(document, chunker)
         self.add_document(chunked_document)
 
         if IndexMethod.KNOWLEDGE_GRAPH in self.index_methods:
-
-            def add_chunk_to_kg(chunk):
-                logger.info("Adding chunk <id: %s> to knowledge graph.", chunk.id)
-                self._kg_index.add_chunk(chunk)
-
-            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
-                list(executor.map(add_chunk_to_kg, chunked_document.chunks))
+            self._kg_index.add_chunks(
+                chunked_document.chunks, max_workers=self._max_workers
+            )
 
         return chunked_document
 
@@ -1,3 +1,4 @@
+import asyncio
 from abc import abstractmethod
 
 from autoflow.types import BaseComponent
@@ -11,3 +12,6 @@ class KGExtractor(BaseComponent):
     @abstractmethod
     def extract(self, text: str) -> GeneratedKnowledgeGraph:
         raise NotImplementedError()
+
+    async def aextract(self, text: str) -> GeneratedKnowledgeGraph:
+        return await asyncio.to_thread(self.extract, text)
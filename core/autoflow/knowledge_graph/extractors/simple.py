@@ -1,23 +1,51 @@
+from typing import Optional
+
 import dspy
 
 from autoflow.knowledge_graph.extractors.base import KGExtractor
+from autoflow.knowledge_graph.programs.cache import (
+    ExtractionCache,
+    SemanticExtractionCache,
+)
 from autoflow.knowledge_graph.programs.extract_covariates import (
     EntityCovariateExtractor,
 )
 from autoflow.knowledge_graph.programs.extract_graph import KnowledgeGraphExtractor
 from autoflow.knowledge_graph.types import GeneratedKnowledgeGraph
+from autoflow.storage.doc_store.types import Chunk
 
 
 class SimpleKGExtractor(KGExtractor):
-    def __init__(self, dspy_lm: dspy.LM):
+    def __init__(
+        self,
+        dspy_lm: dspy.LM,
+        cache: Optional[ExtractionCache] = None,
+        semantic_cache: Optional[SemanticExtractionCache] = None,
+    ):
         super().__init__()
         self._dspy_lm = dspy_lm
-        self._graph_extractor = KnowledgeGraphExtractor(dspy_lm)
+        self._graph_extractor = KnowledgeGraphExtractor(
+            dspy_lm, cache=cache, semantic_cache=semantic_cache
+        )
         self._entity_metadata_extractor = EntityCovariateExtractor(dspy_lm)
 
-    def extract(self, text: str) -> GeneratedKnowledgeGraph:
+    def extract(self, text: str | Chunk) -> GeneratedKnowledgeGraph:
+        # Only the text of a chunk should be sent to the LLM, not its whole repr.
+        if isinstance(text, Chunk):
+            text = text.text
+
         knowledge_graph = self._graph_extractor.forward(text)
         knowledge_graph.entities = self._entity_metadata_extractor.forward(
             text, knowledge_graph.entities
         )
         return knowledge_graph
+
+    async def aextract(self, text: str | Chunk) -> GeneratedKnowledgeGraph:
+        if isinstance(text, Chunk):
+            text = text.text
+
+        knowledge_graph = await self._graph_extractor.aforward(text)
+        knowledge_graph.entities = await self._entity_metadata_extractor.aforward(
+            text, knowledge_graph.entities
+        )
+        return knowledge_graph
@@ -1,9 +1,20 @@
+import asyncio
+import atexit
 import logging
-from typing import Optional
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
 
 import dspy
 
 from autoflow.knowledge_graph.extractors.simple import SimpleKGExtractor
+from autoflow.knowledge_graph.programs.cache import (
+    ExtractionCache,
+    SemanticExtractionCache,
+)
 from autoflow.knowledge_graph.retrievers.weighted import WeightedGraphRetriever
 from autoflow.knowledge_graph.types import (
     RetrievedKnowledgeGraph,
@@ -17,6 +28,57 @@ from autoflow.types import BaseComponent
 
 logger = logging.getLogger(__name__)
 
+# Same default as ThreadPoolExecutor, the workload is I/O bound (LLM calls).
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# More concurrent requests than the LLM provider allows only end up in 429 errors
+# and retries, so the extraction concurrency is capped by this limit by default.
+DEFAULT_LLM_CONCURRENCY_LIMIT = 20
+
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """
+    Get the process-wide executor used to extract knowledge graph from chunks.
+
+    Executors are created lazily on first use, shared across indexes with the same
+    `max_workers`, and shut down when the interpreter exits.
+    """
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="kg_index"
+            )
+            atexit.register(executor.shutdown, wait=True)
+            _executors[max_workers] = executor
+        return executor
+
+
+class _ProgressLogger:
+    """
+    Log the progress of a batch at most once per interval, so that workers do not
+    contend on the logging lock for every finished chunk.
+    """
+
+    def __init__(self, total: int, interval: float = 10.0):
+        self._total = total
+        self._interval = interval
+        self._done = 0
+        self._last_logged_at = time.monotonic()
+
+    def update(self, n: int = 1) -> None:
+        self._done += n
+        now = time.monotonic()
+        if self._done >= self._total or now - self._last_logged_at >= self._interval:
+            self._last_logged_at = now
+            logger.info(
+                "Added the subgraphs of %d/%d chunks to knowledge graph.",
+                self._done,
+                self._total,
+            )
+
 
 class KnowledgeGraphIndex(BaseComponent):
     def __init__(
@@ -24,12 +86,21 @@ class KnowledgeGraphIndex(BaseComponent):
         kg_store: GraphStore,
         dspy_lm: dspy.LM,
         embedding_model: EmbeddingModel,
+        llm_concurrency_limit: int = DEFAULT_LLM_CONCURRENCY_LIMIT,
+        extraction_cache: Optional[ExtractionCache] = None,
+        semantic_extraction_cache: Optional[SemanticExtractionCache] = None,
     ):
         super().__init__()
         self._kg_store = kg_store
         self._dspy_lm = dspy_lm
         self._embedding_model = embedding_model
-        self._kg_extractor = SimpleKGExtractor(self._dspy_lm)
+        self._kg_extractor = SimpleKGExtractor(
+            self._dspy_lm,
+            cache=extraction_cache,
+            semantic_cache=semantic_extraction_cache,
+        )
+        self._llm_concurrency_limit = llm_concurrency_limit
+        self._llm_semaphore = threading.BoundedSemaphore(llm_concurrency_limit)
 
     def add_text(self, text: str) -> Optional[KnowledgeGraph]:
         knowledge_graph = self._kg_extractor.extract(text)
@@ -37,18 +108,217 @@ class KnowledgeGraphIndex(BaseComponent):
 
     def add_chunk(self, chunk: Chunk) -> Optional[KnowledgeGraph]:
         # Check if the chunk has been added.
-        exists_relationships = self._kg_store.list_relationships(chunk_id=chunk.id)
-        if len(exists_relationships) > 0:
+        if len(self._kg_store.existing_chunk_ids([chunk.id])) > 0:
             logger.warning(
                 "The subgraph of chunk %s has already been added, skip.", chunk.id
             )
             return None
 
-        logger.info("Extracting knowledge graph from chunk %s", chunk.id)
-        knowledge_graph = self._kg_extractor.extract(chunk)
-        logger.info("Knowledge graph extracted from chunk %s", chunk.id)
+        return self._add_chunk(chunk)
 
-        return self._kg_store.add(knowledge_graph.to_create())
+    def _add_chunk(self, chunk: Chunk) -> Optional[KnowledgeGraph]:
+        return self._add_chunks_with_same_text([chunk])[0]
+
+    def _add_chunks_with_same_text(
+        self, chunks: List[Chunk]
+    ) -> List[Optional[KnowledgeGraph]]:
+        chunk = chunks[0]
+        logger.debug("Extracting knowledge graph from chunk %s", chunk.id)
+        with self._llm_semaphore:
+            knowledge_graph = self._kg_extractor.extract(chunk.text)
+        logger.debug("Knowledge graph extracted from chunk %s", chunk.id)
+
+        if len(chunks) > 1:
+            logger.debug(
+                "Reuse the knowledge graph of chunk %s for %d duplicate chunks",
+                chunk.id,
+                len(chunks) - 1,
+            )
+
+        return [
+            self._kg_store.add(
+                knowledge_graph.to_create(
+                    chunk_id=c.id,
+                    document_id=c.document_id,
+                )
+            )
+            for c in chunks
+        ]
+
+    def add_chunks(
+        self,
+        chunks: List[Chunk],
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Optional[KnowledgeGraph]]:
+        """
+        Extract and add the knowledge graphs of multiple chunks in parallel.
+
+        Args:
+            chunks: The chunks to extract knowledge graph from.
+            max_workers: The max number of chunks to be processed concurrently.
+            timeout: The max seconds to wait for the whole batch, the chunks not yet
+                processed are cancelled when it is exceeded.
+
+        Returns:
+            The added knowledge graphs, in the same order as the input chunks.
+        """
+        # Process a single chunk in the calling thread, no need to dispatch it.
+        if len(chunks) == 1 and timeout is None:
+            return [self.add_chunk(chunks[0])]
+
+        # Workers beyond the LLM concurrency limit would only wait for the LLM.
+        max_workers = min(
+            max_workers or DEFAULT_MAX_WORKERS, self._llm_concurrency_limit
+        )
+        executor = _get_executor(max_workers)
+        # Bound the in-flight futures so that huge chunk lists do not queue up all
+        # at once before any work completes.
+        max_pending = 2 * max_workers
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        # Check which chunks have been added with one query instead of one per chunk.
+        added_chunk_ids = self._kg_store.existing_chunk_ids(
+            [chunk.id for chunk in chunks]
+        )
+
+        chunk_groups = self._group_chunks(chunks, added_chunk_ids)
+
+        results: List[Optional[KnowledgeGraph]] = [None] * len(chunks)
+        pending: Dict[Future, List[Tuple[int, Chunk]]] = {}
+        progress = _ProgressLogger(total=sum(len(group) for group in chunk_groups))
+        num_unsubmitted = sum(len(group) for group in chunk_groups)
+        for group in chunk_groups:
+            if len(pending) >= max_pending:
+                self._collect_results(
+                    pending, results, progress, deadline, num_unsubmitted
+                )
+            future = executor.submit(
+                self._add_chunks_with_same_text, [chunk for _, chunk in group]
+            )
+            pending[future] = group
+            num_unsubmitted -= len(group)
+
+        while pending:
+            self._collect_results(pending, results, progress, deadline)
+        return results
+
+    def _group_chunks(
+        self, chunks: List[Chunk], added_chunk_ids: Set[UUID]
+    ) -> List[List[Tuple[int, Chunk]]]:
+        """
+        Group the chunks not added yet by their text, along with their indexes in the
+        input, so that chunks with the same text share one LLM call.
+        """
+        chunk_groups: Dict[str, List[Tuple[int, Chunk]]] = {}
+        for i, chunk in enumerate(chunks):
+            if chunk.id in added_chunk_ids:
+                logger.warning(
+                    "The subgraph of chunk %s has already been added, skip.", chunk.id
+                )
+                continue
+            chunk_groups.setdefault(chunk.hash, []).append((i, chunk))
+        return list(chunk_groups.values())
+
+    def _collect_results(
+        self,
+        pending: Dict[Future, List[Tuple[int, Chunk]]],
+        results: List[Optional[KnowledgeGraph]],
+        progress: _ProgressLogger,
+        deadline: Optional[float] = None,
+        num_unsubmitted: int = 0,
+    ) -> None:
+        remaining = None
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if len(done) == 0:
+            for future in pending:
+                future.cancel()
+            # Count the chunks not submitted yet too, they are abandoned as well.
+            num_chunks = num_unsubmitted + sum(len(group) for group in pending.values())
+            raise TimeoutError(
+                f"Timed out waiting for {num_chunks} chunks to be added to knowledge graph."
+            )
+
+        for future in done:
+            group = pending.pop(future)
+            try:
+                knowledge_graphs = future.result()
+            except Exception:
+                logger.exception(
+                    "Failed to add the subgraph of chunk %s to knowledge graph.",
+                    group[0][1].id,
+                )
+                # Like on timeout, do not leave the rest running unobserved.
+                for future in pending:
+                    future.cancel()
+                raise
+            for (chunk_index, _), knowledge_graph in zip(group, knowledge_graphs):
+                results[chunk_index] = knowledge_graph
+            progress.update(len(group))
+
+    async def aadd_chunks(
+        self,
+        chunks: List[Chunk],
+        max_concurrency: Optional[int] = None,
+    ) -> List[Optional[KnowledgeGraph]]:
+        """
+        Extract and add the knowledge graphs of multiple chunks concurrently with
+        asyncio, the LLM calls are awaited natively instead of holding a thread
+        each. Before dspy 2.6.19, which can not await the LM natively, the calls
+        run in DSPy's worker threads and are further capped by
+        `dspy.settings.async_max_workers`.
+
+        Args:
+            chunks: The chunks to extract knowledge graph from.
+            max_concurrency: The max number of chunks to be processed concurrently.
+
+        Returns:
+            The added knowledge graphs, in the same order as the input chunks.
+        """
+        semaphore = asyncio.Semaphore(
+            min(max_concurrency or DEFAULT_MAX_WORKERS, self._llm_concurrency_limit)
+        )
+        added_chunk_ids = await asyncio.to_thread(
+            self._kg_store.existing_chunk_ids, [chunk.id for chunk in chunks]
+        )
+        chunk_groups = self._group_chunks(chunks, added_chunk_ids)
+
+        results: List[Optional[KnowledgeGraph]] = [None] * len(chunks)
+        progress = _ProgressLogger(total=sum(len(group) for group in chunk_groups))
+
+        async def add_chunk_group(group: List[Tuple[int, Chunk]]) -> None:
+            async with semaphore:
+                knowledge_graphs = await self._aadd_chunks_with_same_text(
+                    [chunk for _, chunk in group]
+                )
+            for (chunk_index, _), knowledge_graph in zip(group, knowledge_graphs):
+                results[chunk_index] = knowledge_graph
+            progress.update(len(group))
+
+        await asyncio.gather(*(add_chunk_group(group) for group in chunk_groups))
+        return results
+
+    async def _aadd_chunks_with_same_text(
+        self, chunks: List[Chunk]
+    ) -> List[Optional[KnowledgeGraph]]:
+        chunk = chunks[0]
+        logger.debug("Extracting knowledge graph from chunk %s", chunk.id)
+        knowledge_graph = await self._kg_extractor.aextract(chunk.text)
+        logger.debug("Knowledge graph extracted from chunk %s", chunk.id)
+
+        return [
+            await asyncio.to_thread(
+                self._kg_store.add,
+                knowledge_graph.to_create(
+                    chunk_id=c.id,
+                    document_id=c.document_id,
+                ),
+            )
+            for c in chunks
+        ]
 
     def retrieve(
         self,
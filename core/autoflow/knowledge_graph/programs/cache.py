@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional
+
+from autoflow.models.embedding_models import EmbeddingModel
+
+
+def make_cache_key(*parts: str) -> str:
+    """
+    Hash the parts into a cache key, each part is length-prefixed so that different
+    splits of the same bytes never collide.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressable cache of extraction outputs (as JSON strings).
+
+    The most recently used entries are kept in memory (up to `max_entries`), and
+    all entries are also persisted as files under `cache_dir` if it is specified,
+    so that the same texts are not sent to the LLM again across runs.
+    """
+
+    def __init__(self, cache_dir: Optional[str | Path] = None, max_entries: int = 1024):
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self._cache_dir is not None:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_path(self, key: str) -> Path:
+        return self._cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        if self._cache_dir is None:
+            return None
+        try:
+            value = self._get_path(key).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._remember(key, value)
+        if self._cache_dir is not None:
+            # Write to a temporary file first, so that concurrent readers never see
+            # a partially written entry.
+            path = self._get_path(key)
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_text(value, encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._cache_dir is not None:
+            self._get_path(key).unlink(missing_ok=True)
+
+    def _remember(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class SemanticExtractionCache:
+    """
+    Cache of extraction outputs looked up by the similarity of the input texts, so
+    that paraphrased or near-duplicate paragraphs reuse a prior extraction instead
+    of calling the LLM again.
+
+    The embeddings are kept in memory and searched by brute force, which is meant
+    for caches of up to a few thousand entries; the oldest entries are dropped
+    beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 10000,
+    ):
+        self._embedding_model = embedding_model
+        self._similarity_threshold = similarity_threshold
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # The embeddings are stored as the rows of a matrix that grows by doubling
+        # up to `max_entries` rows, and is then reused as a ring buffer, so that
+        # adding an entry is amortized O(1), and copies nothing once it is full.
+        self._matrix = None
+        self._size = 0
+        self._next_slot = 0
+        self._namespaces: List[Optional[str]] = []
+        self._values: List[Optional[str]] = []
+
+    def embed(self, text: str) -> Any:
+        import numpy as np
+
+        embedding = np.asarray(
+            self._embedding_model.get_text_embedding(text), dtype=np.float32
+        )
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _search(self, embedding: Any, namespace: str) -> List[int]:
+        """Return the slots of the entries similar enough, the most similar first."""
+        import numpy as np
+
+        if self._size == 0:
+            return []
+        similarities = self._matrix[: self._size] @ embedding
+        slots = np.flatnonzero(similarities >= self._similarity_threshold)
+        slots = slots[np.argsort(similarities[slots])[::-1]]
+        # Entries of other namespaces (models or prompt versions) never match.
+        return [int(i) for i in slots if self._namespaces[i] == namespace]
+
+    def get(self, embedding: Any, namespace: str) -> Optional[str]:
+        with self._lock:
+            slots = self._search(embedding, namespace)
+            return self._values[slots[0]] if slots else None
+
+    def put(self, embedding: Any, namespace: str, value: str) -> None:
+        import numpy as np
+
+        with self._lock:
+            if self._size < self._max_entries:
+                if self._matrix is None or self._size == len(self._matrix):
+                    capacity = min(max(16, 2 * self._size), self._max_entries)
+                    matrix = np.zeros((capacity, len(embedding)), dtype=np.float32)
+                    if self._matrix is not None:
+                        matrix[: self._size] = self._matrix
+                    self._matrix = matrix
+                slot = self._size
+                self._size += 1
+                self._namespaces.append(namespace)
+                self._values.append(value)
+            else:
+                # Overwrite the oldest entry.
+                slot = self._next_slot
+                self._next_slot = (self._next_slot + 1) % self._max_entries
+                self._namespaces[slot] = namespace
+                self._values[slot] = value
+            self._matrix[slot] = embedding
+
+    def delete(self, embedding: Any, namespace: str) -> None:
+        with self._lock:
+            for slot in self._search(embedding, namespace):
+                self._matrix[slot] = 0
+                self._namespaces[slot] = None
+                self._values[slot] = None
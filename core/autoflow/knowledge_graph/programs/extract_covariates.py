@@ -10,6 +10,9 @@ from autoflow.knowledge_graph.types import GeneratedEntity
 
 logger = logging.getLogger(__name__)
 
+# Whether the installed dspy can await the LM natively (dspy >= 2.6.19).
+_NATIVE_ASYNC = "aforward" in vars(Predict)
+
 
 class InputEntity(BaseModel):
     """List of entities extracted from the text to form the knowledge graph"""
@@ -62,24 +65,42 @@ class EntityCovariateExtractor(dspy.Module):
     def forward(
         self, text: str, entities: List[GeneratedEntity]
     ) -> List[GeneratedEntity]:
-        with dspy.settings.context(lm=self.dspy_lm):
-            input_entities = [
-                InputEntity(
-                    name=entity.name,
-                    description=entity.description,
-                )
-                for entity in entities
-            ]
-
-            predict = self.program(
-                text=text,
-                input=input_entities,
+        predict = self.program(
+            text=text,
+            input=self._to_input_entities(entities),
+            lm=self.dspy_lm,
+        )
+        return self._update_covariates(entities, predict.output)
+
+    async def aforward(
+        self, text: str, entities: List[GeneratedEntity]
+    ) -> List[GeneratedEntity]:
+        if not _NATIVE_ASYNC:
+            return await dspy.asyncify(self)(text, entities)
+
+        predict = await self.program.acall(
+            text=text,
+            input=self._to_input_entities(entities),
+            lm=self.dspy_lm,
+        )
+        return self._update_covariates(entities, predict.output)
+
+    def _to_input_entities(self, entities: List[GeneratedEntity]) -> List[InputEntity]:
+        return [
+            InputEntity(
+                name=entity.name,
+                description=entity.description,
             )
+            for entity in entities
+        ]
 
-            output_entity_map = {entity.name: entity for entity in predict.output}
-            for entity in entities:
-                if entity.name in output_entity_map:
-                    # Update the covariates in the metadata of the entity.
-                    entity.meta = output_entity_map[entity.name].covariates
+    def _update_covariates(
+        self, entities: List[GeneratedEntity], output_entities: List[OutputEntity]
+    ) -> List[GeneratedEntity]:
+        output_entity_map = {entity.name: entity for entity in output_entities}
+        for entity in entities:
+            if entity.name in output_entity_map:
+                # Update the covariates in the metadata of the entity.
+                entity.meta = output_entity_map[entity.name].covariates
 
-            return entities
+        return entities
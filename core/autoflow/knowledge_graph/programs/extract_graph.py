@@ -1,10 +1,25 @@
+import asyncio
+import copy
+import json
 import logging
-from typing import List
+from itertools import islice
+from typing import Any, Iterator, List, Optional, Tuple
 
 import dspy
 from dspy import Predict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
+try:
+    from dspy.utils.exceptions import AdapterParseError
+except ImportError:
+    # Before dspy 2.6.13, adapters raise ValueError on unparsable outputs.
+    AdapterParseError = ValueError
+
+from autoflow.knowledge_graph.programs.cache import (
+    ExtractionCache,
+    SemanticExtractionCache,
+    make_cache_key,
+)
 from autoflow.knowledge_graph.types import (
     GeneratedEntity,
     GeneratedKnowledgeGraph,
@@ -13,6 +28,18 @@ from autoflow.knowledge_graph.types import (
 
 logger = logging.getLogger(__name__)
 
+_DataFrame = None
+
+
+def _get_data_frame_class():
+    # pandas is an optional dependency, only import it on the first use.
+    global _DataFrame
+    if _DataFrame is None:
+        from pandas import DataFrame
+
+        _DataFrame = DataFrame
+    return _DataFrame
+
 
 class PredictEntity(BaseModel):
     """Entity extracted from the text to form the knowledge graph"""
@@ -57,52 +84,48 @@ class PredictKnowledgeGraph(BaseModel):
     )
 
     def to_pandas(self):
-        from pandas import DataFrame
+        DataFrame = _get_data_frame_class()
 
+        # Build the data frames column by column to avoid a dict per row.
         return {
             "entities": DataFrame(
-                [
-                    {
-                        "name": entity.name,
-                        "description": entity.description,
-                    }
-                    for entity in self.entities
-                ]
+                {
+                    "name": [entity.name for entity in self.entities],
+                    "description": [entity.description for entity in self.entities],
+                }
             ),
             "relationships": DataFrame(
-                [
-                    {
-                        "source_entity": relationship.source_entity,
-                        "relationship_desc": relationship.relationship_desc,
-                        "target_entity": relationship.target_entity,
-                    }
-                    for relationship in self.relationships
-                ]
+                {
+                    "source_entity": [
+                        relationship.source_entity
+                        for relationship in self.relationships
+                    ],
+                    "relationship_desc": [
+                        relationship.relationship_desc
+                        for relationship in self.relationships
+                    ],
+                    "target_entity": [
+                        relationship.target_entity
+                        for relationship in self.relationships
+                    ],
+                }
             ),
         }
 
 
 class ExtractKnowledgeGraph(dspy.Signature):
-    """Carefully analyze the provided text from database documentation and community blogs to thoroughly identify all entities related to database technologies, including both general concepts and specific details.
-
-    Follow these Step-by-Step Analysis:
+    """Carefully analyze the provided text from database documentation and community blogs to identify all entities related to database technologies, including both general concepts and specific details, and the relationships between them.
 
     1. Extract Meaningful Entities:
-      - Identify all significant nouns, proper nouns, and technical terminologies that represent database-related concepts, objects, components, features, issues, key steps, execute order, user case, locations, versions, or any substantial entities.
-      - Ensure that you capture entities across different levels of detail, from high-level overviews to specific technical specifications, to create a comprehensive representation of the subject matter.
-      - Choose names for entities that are specific enough to indicate their meaning without additional context, avoiding overly generic terms.
-      - Consolidate similar entities to avoid redundancy, ensuring each represents a distinct concept at appropriate granularity levels.
+      - Identify all significant nouns, proper nouns, and technical terms representing database-related concepts, objects, components, features, issues, key steps, execution order, use cases, locations, versions, or other substantial entities, from high-level overviews to specific technical details.
+      - Name entities specifically enough to be meaningful without additional context, avoid overly generic terms.
+      - Consolidate similar entities, so that each represents a distinct concept.
 
     2. Establish Relationships:
-      - Carefully examine the text to identify all relationships between clearly-related entities, ensuring each relationship is correctly captured with accurate details about the interactions.
-      - Analyze the context and interactions between the identified entities to determine how they are interconnected, focusing on actions, associations, dependencies, or similarities.
-      - Clearly define the relationships, ensuring accurate directionality that reflects the logical or functional dependencies among entities. \
-         This means identifying which entity is the source, which is the target, and what the nature of their relationship is (e.g., $source_entity depends on $target_entity for $relationship).
+      - Identify all relationships between clearly-related entities, focusing on actions, associations, dependencies, or similarities.
+      - Keep the directionality accurate: e.g., $source_entity depends on $target_entity for $relationship.
 
-    Some key points to consider:
-      - Please endeavor to extract all meaningful entities and relationships from the text, avoid subsequent additional gleanings.
-
-    Objective: Produce a detailed and comprehensive knowledge graph that captures the full spectrum of entities mentioned in the text, along with their interrelations, reflecting both broad concepts and intricate details specific to the database domain.
+    Extract all meaningful entities and relationships in one pass, avoid subsequent additional gleanings.
 
     Please only response in JSON format.
     """
@@ -115,33 +138,304 @@ class ExtractKnowledgeGraph(dspy.Signature):
     )
 
 
+# Changes whenever the prompt or the output schema changes, so that cached
+# extractions of an older prompt are never reused.
+PROMPT_VERSION = make_cache_key(
+    ExtractKnowledgeGraph.instructions,
+    json.dumps(PredictKnowledgeGraph.model_json_schema(), sort_keys=True),
+)
+
+# The program is stateless aside from the LM, which is passed in on each call,
+# so it is built once, and each extractor takes a shallow copy of it, so that
+# loading demos into one extractor does not leak into the others.
+_extract_graph_program = Predict(ExtractKnowledgeGraph)
+
+# Retries carry the error of the previous attempt back to the LLM, using a
+# separate signature so that the prompt of the first attempt stays unchanged.
+_extract_graph_with_feedback_program = Predict(
+    ExtractKnowledgeGraph.append(
+        "feedback",
+        dspy.InputField(
+            desc="the error of your previous output, fix it in this response"
+        ),
+        type_=str,
+    )
+)
+
+# The errors of an LLM output that can not be parsed into PredictKnowledgeGraph,
+# pydantic's ValidationError is a subclass of ValueError.
+_OUTPUT_ERRORS = (ValueError, AdapterParseError)
+
+# Predict.aforward awaits the LM natively since dspy 2.6.19, older versions
+# can only run the programs in worker threads.
+_NATIVE_ASYNC = "aforward" in vars(Predict)
+
+DEFAULT_MAX_FEEDBACK_RETRIES = 2
+DEFAULT_MAX_ENTITIES = 500
+DEFAULT_MAX_RELATIONSHIPS = 2000
+
+
 class KnowledgeGraphExtractor(dspy.Module):
-    def __init__(self, dspy_lm: dspy.LM):
+    def __init__(
+        self,
+        dspy_lm: dspy.LM,
+        cache: Optional[ExtractionCache] = None,
+        semantic_cache: Optional[SemanticExtractionCache] = None,
+        max_feedback_retries: int = DEFAULT_MAX_FEEDBACK_RETRIES,
+        max_entities: int = DEFAULT_MAX_ENTITIES,
+        max_relationships: int = DEFAULT_MAX_RELATIONSHIPS,
+    ):
         super().__init__()
         self.dspy_lm = dspy_lm
-        self.program = Predict(ExtractKnowledgeGraph)
+        self.program = copy.copy(_extract_graph_program)
+        self.feedback_program = copy.copy(_extract_graph_with_feedback_program)
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.max_feedback_retries = max_feedback_retries
+        self.max_entities = max_entities
+        self.max_relationships = max_relationships
 
     def forward(self, text: str) -> GeneratedKnowledgeGraph:
-        with dspy.settings.context(lm=self.dspy_lm):
-            prediction = self.program(text=text)
-            entities = [
-                GeneratedEntity(
-                    name=entity.name,
-                    description=entity.description,
-                    meta={},
-                )
-                for entity in prediction.knowledge.entities
-            ]
-            relationships = [
-                GeneratedRelationship(
-                    source_entity_name=relationship.source_entity,
-                    target_entity_name=relationship.target_entity,
-                    description=relationship.relationship_desc,
-                    meta={},
+        knowledge, cache_entry = self._get_cached(text)
+        if knowledge is None:
+            knowledge = self._predict(text)
+            self._put_cached(cache_entry, knowledge)
+        return self._to_generated_knowledge_graph(knowledge)
+
+    def _get_cached(
+        self, text: str
+    ) -> Tuple[Optional[PredictKnowledgeGraph], Tuple[str, Optional[str], Any]]:
+        """
+        Look up the extraction of the text in the caches, returns the cached
+        knowledge if any, and the entry to store a new extraction into.
+        """
+        namespace = f"{self.dspy_lm.model}:{PROMPT_VERSION}"
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(namespace, text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                knowledge = self._load_cached(cached)
+                if knowledge is not None:
+                    return knowledge, (namespace, cache_key, None)
+                self.cache.delete(cache_key)
+
+        embedding = None
+        if self.semantic_cache is not None:
+            embedding = self.semantic_cache.embed(text)
+            cached = self.semantic_cache.get(embedding, namespace)
+            if cached is not None:
+                knowledge = self._load_cached(cached)
+                if knowledge is not None:
+                    logger.debug("Reuse the extraction of a similar text.")
+                    return knowledge, (namespace, cache_key, embedding)
+                self.semantic_cache.delete(embedding, namespace)
+
+        return None, (namespace, cache_key, embedding)
+
+    def _put_cached(
+        self,
+        cache_entry: Tuple[str, Optional[str], Any],
+        knowledge: PredictKnowledgeGraph,
+    ) -> None:
+        namespace, cache_key, embedding = cache_entry
+        knowledge_json = None
+        if cache_key is not None:
+            knowledge_json = knowledge.model_dump_json()
+            self.cache.put(cache_key, knowledge_json)
+        if embedding is not None:
+            knowledge_json = knowledge_json or knowledge.model_dump_json()
+            self.semantic_cache.put(embedding, namespace, knowledge_json)
+
+    def _predict(self, text: str) -> PredictKnowledgeGraph:
+        # Pass the LM to the call directly instead of entering
+        # dspy.settings.context, which pushes and pops thread-local settings.
+        try:
+            return self.program(text=text, lm=self.dspy_lm).knowledge
+        except _OUTPUT_ERRORS as e:
+            error = e
+
+        for attempt in range(1, self.max_feedback_retries + 1):
+            logger.warning(
+                "Invalid knowledge graph output, retry with feedback (%d/%d): %s",
+                attempt,
+                self.max_feedback_retries,
+                error,
+            )
+            try:
+                prediction = self.feedback_program(
+                    text=text,
+                    feedback=f"Your output had error: {error}. Fix and retry.",
+                    lm=self.dspy_lm,
                 )
-                for relationship in prediction.knowledge.relationships
-            ]
-            return GeneratedKnowledgeGraph(
-                entities=entities,
-                relationships=relationships,
+                return prediction.knowledge
+            except _OUTPUT_ERRORS as e:
+                error = e
+        raise error
+
+    def _load_cached(self, value: str) -> Optional[PredictKnowledgeGraph]:
+        try:
+            return PredictKnowledgeGraph.model_validate_json(value)
+        except ValidationError:
+            logger.warning("Invalid cached extraction, evict it.")
+            return None
+
+    def forward_many(
+        self, texts: List[str], num_threads: Optional[int] = None
+    ) -> List[Optional[GeneratedKnowledgeGraph]]:
+        """
+        Extract knowledge graphs from multiple texts with DSPy's native batching.
+
+        Args:
+            texts: The texts to extract knowledge graph from.
+            num_threads: The number of threads DSPy uses to call the LLM, defaults to
+                `dspy.settings.num_threads`.
+
+        Returns:
+            The extracted knowledge graphs, in the same order as the input texts,
+            `None` for the texts failed to be extracted.
+        """
+        # Batch the whole extractor instead of the bare program, so that the
+        # caches, feedback retries and output caps also apply to each text.
+        examples = [dspy.Example(text=text).with_inputs("text") for text in texts]
+        # Tolerate the failure of every text, DSPy cancels the whole batch once the
+        # errors exceed max_errors, and keep the library quiet on stderr.
+        return self.batch(
+            examples,
+            num_threads=num_threads,
+            max_errors=len(texts),
+            disable_progress_bar=True,
+        )
+
+    def iter_entities(
+        self, knowledge: PredictKnowledgeGraph
+    ) -> Iterator[GeneratedEntity]:
+        # The prediction has been validated against PredictKnowledgeGraph, skip
+        # validating the same fields again.
+        for entity in islice(knowledge.entities, self.max_entities):
+            yield GeneratedEntity.model_construct(
+                name=entity.name,
+                description=entity.description,
+                meta={},
+            )
+
+    def iter_relationships(
+        self, knowledge: PredictKnowledgeGraph
+    ) -> Iterator[GeneratedRelationship]:
+        # Drop the relationships pointing at the entities truncated by the cap,
+        # they can not be resolved when the graph is stored.
+        kept_entity_names = {
+            entity.name for entity in knowledge.entities[: self.max_entities]
+        }
+        truncated_entity_names = {
+            entity.name
+            for entity in knowledge.entities[self.max_entities :]
+            if entity.name not in kept_entity_names
+        }
+        relationships = (
+            relationship
+            for relationship in knowledge.relationships
+            if relationship.source_entity not in truncated_entity_names
+            and relationship.target_entity not in truncated_entity_names
+        )
+        for relationship in islice(relationships, self.max_relationships):
+            yield GeneratedRelationship.model_construct(
+                source_entity_name=relationship.source_entity,
+                target_entity_name=relationship.target_entity,
+                description=relationship.relationship_desc,
+                meta={},
+            )
+
+    def _to_generated_knowledge_graph(
+        self, knowledge: PredictKnowledgeGraph
+    ) -> GeneratedKnowledgeGraph:
+        # Bound the output of a misbehaving LLM, which would otherwise blow up the
+        # embedding and indexing cost downstream.
+        if len(knowledge.entities) > self.max_entities:
+            logger.warning(
+                "Extracted %d entities, only keep the first %d and their "
+                "relationships.",
+                len(knowledge.entities),
+                self.max_entities,
             )
+        if len(knowledge.relationships) > self.max_relationships:
+            logger.warning(
+                "Extracted %d relationships, only keep the first %d.",
+                len(knowledge.relationships),
+                self.max_relationships,
+            )
+        return GeneratedKnowledgeGraph(
+            entities=list(self.iter_entities(knowledge)),
+            relationships=list(self.iter_relationships(knowledge)),
+        )
+
+    async def aforward(self, text: str) -> GeneratedKnowledgeGraph:
+        if not _NATIVE_ASYNC:
+            # dspy.asyncify runs the program in DSPy's worker threads, which are
+            # bounded by dspy.settings.async_max_workers.
+            return await dspy.asyncify(self)(text)
+
+        # The caches may hit the disk or the embedding model, keep them off the
+        # event loop.
+        if self.cache is None and self.semantic_cache is None:
+            knowledge, cache_entry = None, None
+        else:
+            knowledge, cache_entry = await asyncio.to_thread(self._get_cached, text)
+
+        if knowledge is None:
+            knowledge = await self._apredict(text)
+            if cache_entry is not None:
+                await asyncio.to_thread(self._put_cached, cache_entry, knowledge)
+        return self._to_generated_knowledge_graph(knowledge)
+
+    async def _apredict(self, text: str) -> PredictKnowledgeGraph:
+        # Await the LM natively, so that the concurrency is not capped by the
+        # worker threads of dspy.asyncify.
+        try:
+            return (await self.program.acall(text=text, lm=self.dspy_lm)).knowledge
+        except _OUTPUT_ERRORS as e:
+            error = e
+
+        for attempt in range(1, self.max_feedback_retries + 1):
+            logger.warning(
+                "Invalid knowledge graph output, retry with feedback (%d/%d): %s",
+                attempt,
+                self.max_feedback_retries,
+                error,
+            )
+            try:
+                prediction = await self.feedback_program.acall(
+                    text=text,
+                    feedback=f"Your output had error: {error}. Fix and retry.",
+                    lm=self.dspy_lm,
+                )
+                return prediction.knowledge
+            except _OUTPUT_ERRORS as e:
+                error = e
+        raise error
+
+    async def abatch(
+        self, texts: List[str], max_concurrency: int = 16
+    ) -> List[GeneratedKnowledgeGraph]:
+        """
+        Extract knowledge graphs from multiple texts concurrently.
+
+        Args:
+            texts: The texts to extract knowledge graph from.
+            max_concurrency: The max number of concurrent LLM calls, for self-hosted
+                LLMs it should not exceed the parallelism of the server, e.g.
+                `OLLAMA_NUM_PARALLEL` for Ollama. Before dspy 2.6.19, which can not
+                await the LM natively, it is further capped by
+                `dspy.settings.async_max_workers`.
+
+        Returns:
+            The extracted knowledge graphs, in the same order as the input texts.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def extract(text: str) -> GeneratedKnowledgeGraph:
+            async with semaphore:
+                return await self.aforward(text)
+
+        return await asyncio.gather(*(extract(text) for text in texts))
@@ -141,24 +141,41 @@ class TiDBDocumentStore(DocumentStore):
         """
         Add documents.
         """
-        return_documents = []
-        for doc in documents:
-            db_document = self._document_db_model(**doc.model_dump(exclude={"chunks"}))
-            db_document = self._document_table.insert(db_document)
-
-            return_chunks = []
-            if doc.chunks is not None and len(doc.chunks) > 0:
-                db_chunks = self.add_doc_chunks(db_document.id, doc.chunks)
-                return_chunks = [
-                    Chunk(**db_chunk.model_dump(exclude={"document"}))
-                    for db_chunk in db_chunks
-                ]
-
-            return_documents.append(
-                Document(**db_document.model_dump(), chunks=return_chunks)
+        if len(documents) == 0:
+            return []
+
+        # Insert the documents and then all of their chunks in two bulk inserts,
+        # instead of a round-trip (and an embedding request) per document.
+        db_documents = self._document_table.bulk_insert(
+            [
+                self._document_db_model(**doc.model_dump(exclude={"chunks"}))
+                for doc in documents
+            ]
+        )
+
+        db_chunks = [
+            self._chunk_db_model(
+                **c.model_dump(exclude={"document_id"}), document_id=db_document.id
             )
+            for doc, db_document in zip(documents, db_documents)
+            for c in doc.chunks or []
+        ]
+        if len(db_chunks) > 0:
+            db_chunks = self._chunk_table.bulk_insert(db_chunks)
 
-        return return_documents
+        chunks_by_document_id: Dict[UUID, List[Chunk]] = {}
+        for db_chunk in db_chunks:
+            chunks_by_document_id.setdefault(db_chunk.document_id, []).append(
+                Chunk(**db_chunk.model_dump(exclude={"document"}))
+            )
+
+        return [
+            Document(
+                **db_document.model_dump(),
+                chunks=chunks_by_document_id.get(db_document.id, []),
+            )
+            for db_document in db_documents
+        ]
 
     def update(self, document_id: UUID, update: Dict[str, Any]) -> None:
         """
@@ -6,6 +6,7 @@ from typing import (
     Dict,
     List,
     Optional,
+    Set,
     Tuple,
 )
 from uuid import UUID
@@ -113,6 +114,15 @@ class GraphStore(BaseComponent, ABC):
         """List all relationships matching the filters"""
         raise NotImplementedError
 
+    def existing_chunk_ids(self, chunk_ids: Collection[UUID]) -> Set[UUID]:
+        """Get the ids of the chunks whose relationships have been added"""
+        if len(chunk_ids) == 0:
+            return set()
+        relationships = self.list_relationships(
+            RelationshipFilters(chunk_id=list(chunk_ids))
+        )
+        return {relationship.chunk_id for relationship in relationships}
+
     def create_relationship(
         self,
         source_entity: Entity,
@@ -1,5 +1,7 @@
 import logging
-from typing import Collection, Dict, List, Optional, Tuple, Type, Any
+import threading
+from collections import OrderedDict
+from typing import Collection, Dict, List, Optional, Set, Tuple, Type, Any
 from uuid import UUID
 
 from pydantic import PrivateAttr
@@ -163,12 +165,20 @@ class TiDBGraphStore(GraphStore):
         embedding_model: Optional[EmbeddingModel] = None,
         vector_dims: Optional[int] = None,
         entity_distance_threshold: Optional[float] = 0.1,
+        entity_embedding_cache_size: int = 1024,
     ):
         super().__init__()
         self._db = client
         self._db_engine = client.db_engine
         self._embedding_model = embedding_model
         self._entity_distance_threshold = entity_distance_threshold
+        # Entities with the same name and description recur across chunks, cache
+        # their embeddings (LRU) to avoid calling the embedding model again and again.
+        self._entity_embedding_cache: OrderedDict[str, Tuple[float, ...]] = (
+            OrderedDict()
+        )
+        self._entity_embedding_cache_size = entity_embedding_cache_size
+        self._entity_embedding_cache_lock = threading.Lock()
         self._init_store(namespace, vector_dims)
 
     def _init_store(
@@ -247,8 +257,62 @@ class TiDBGraphStore(GraphStore):
         return self._entity_table.insert(entity)
 
     def _get_entity_embedding(self, name: str, description: str) -> list[float]:
-        embedding_str = f"{name}: {description}"
-        return self._embedding_model.get_text_embedding(embedding_str)
+        embedding_str = self._get_entity_embedding_str(name, description)
+        embedding = self._get_cached_entity_embedding(embedding_str)
+        if embedding is None:
+            embedding = self._embedding_model.get_text_embedding(embedding_str)
+            self._cache_entity_embedding(embedding_str, embedding)
+        return list(embedding)
+
+    def _get_entity_embeddings(
+        self, entities: List[Tuple[str, str]]
+    ) -> List[List[float]]:
+        embedding_strs = [
+            self._get_entity_embedding_str(name, description)
+            for name, description in entities
+        ]
+        embeddings = {}
+        for embedding_str in embedding_strs:
+            embedding = self._get_cached_entity_embedding(embedding_str)
+            if embedding is not None:
+                embeddings[embedding_str] = embedding
+
+        # Embed the entities missing from the cache with one batch call instead of
+        # one per entity.
+        misses = [
+            embedding_str
+            for embedding_str in dict.fromkeys(embedding_strs)
+            if embedding_str not in embeddings
+        ]
+        if len(misses) > 0:
+            miss_embeddings = self._embedding_model.get_text_embedding_batch(misses)
+            for embedding_str, embedding in zip(misses, miss_embeddings):
+                self._cache_entity_embedding(embedding_str, embedding)
+                embeddings[embedding_str] = embedding
+
+        return [list(embeddings[embedding_str]) for embedding_str in embedding_strs]
+
+    def _get_cached_entity_embedding(
+        self, embedding_str: str
+    ) -> Optional[Tuple[float, ...]]:
+        with self._entity_embedding_cache_lock:
+            embedding = self._entity_embedding_cache.get(embedding_str)
+            if embedding is not None:
+                self._entity_embedding_cache.move_to_end(embedding_str)
+            return embedding
+
+    def _cache_entity_embedding(self, embedding_str: str, embedding: List[float]):
+        # Keep an immutable copy, so that callers mutating the returned list can
+        # not corrupt the cache.
+        with self._entity_embedding_cache_lock:
+            self._entity_embedding_cache[embedding_str] = tuple(embedding)
+            self._entity_embedding_cache.move_to_end(embedding_str)
+            while len(self._entity_embedding_cache) > self._entity_embedding_cache_size:
+                self._entity_embedding_cache.popitem(last=False)
+
+    @staticmethod
+    def _get_entity_embedding_str(name: str, description: str) -> str:
+        return f"{name}: {description}"
 
     def find_or_create_entity(
         self,
@@ -258,8 +322,9 @@ class TiDBGraphStore(GraphStore):
         meta: Optional[dict] = None,
         embedding: Optional[Any] = None,
     ) -> Entity:
-        query_embedding = self._get_entity_embedding(name, description)
-        query = QueryBundle(query_embedding=query_embedding)
+        if embedding is None:
+            embedding = self._get_entity_embedding(name, description)
+        query = QueryBundle(query_embedding=embedding)
         nearest_entity = self.search_entities(
             query, top_k=1, distance_threshold=self._entity_distance_threshold
         )
@@ -375,6 +440,21 @@ class TiDBGraphStore(GraphStore):
         filter_dict = self._convert_relationship_filters(filters)
         return self._relationship_table.query(filter_dict)
 
+    def existing_chunk_ids(self, chunk_ids: Collection[UUID]) -> Set[UUID]:
+        if len(chunk_ids) == 0:
+            return set()
+
+        relationship_table_name = self._relationship_table.table_name
+        stmt = f"""
+            SELECT DISTINCT chunk_id
+            FROM {relationship_table_name}
+            WHERE chunk_id IN :chunk_ids
+        """
+        results = self._db.query(
+            stmt, {"chunk_ids": [chunk_id.hex for chunk_id in chunk_ids]}
+        ).to_list()
+        return {UUID(item["chunk_id"]) for item in results}
+
     def search_relationships(
         self,
         query: QueryBundle,
@@ -485,6 +565,8 @@ class TiDBGraphStore(GraphStore):
         description: Optional[str] = None,
         meta: Optional[dict] = {},
         embedding: Optional[Any] = None,
+        chunk_id: Optional[UUID] = None,
+        document_id: Optional[UUID] = None,
     ) -> Relationship:
         """
         Create a relationship between two entities.
@@ -509,6 +591,8 @@ class TiDBGraphStore(GraphStore):
             description=description,
             meta=meta,
             embedding=embedding,
+            chunk_id=chunk_id,
+            document_id=document_id,
         )
         return self._relationship_table.insert(relationship)
 
@@ -520,11 +604,27 @@ class TiDBGraphStore(GraphStore):
         target_entity_description: str,
         relationship_desc: str,
     ) -> List[float]:
-        embedding_str = (
+        embedding_str = self._get_relationship_embedding_str(
+            source_entity_name,
+            source_entity_description,
+            target_entity_name,
+            target_entity_description,
+            relationship_desc,
+        )
+        return self._embedding_model.get_text_embedding(embedding_str)
+
+    @staticmethod
+    def _get_relationship_embedding_str(
+        source_entity_name: str,
+        source_entity_description,
+        target_entity_name: str,
+        target_entity_description: str,
+        relationship_desc: str,
+    ) -> str:
+        return (
             f"{source_entity_name}({source_entity_description}) -> "
             f"{relationship_desc} -> {target_entity_name}({target_entity_description}) "
         )
-        return self._embedding_model.get_text_embedding(embedding_str)
 
     def update_relationship(
         self, relationship: Relationship | UUID, update: RelationshipUpdate
@@ -556,22 +656,29 @@ class TiDBGraphStore(GraphStore):
 
     def add(self, knowledge_graph: KnowledgeGraphCreate) -> Optional[KnowledgeGraph]:
         with self._db.session():
+            entity_embeddings = self._get_entity_embeddings(
+                [
+                    (entity.name, entity.description)
+                    for entity in knowledge_graph.entities
+                ]
+            )
+
             # Create or find entities
             entity_map = {}
-            for entity in knowledge_graph.entities:
+            for entity, embedding in zip(knowledge_graph.entities, entity_embeddings):
                 created_entity = self.find_or_create_entity(
                     entity_type=EntityType.original,
                     name=entity.name,
                     description=entity.description,
                     meta=entity.meta,
+                    embedding=embedding,
                 )
                 entity_map[entity.name] = created_entity
             entities = list(entity_map.values())
 
-            # Create relationships
-            relationships = []
+            # Resolve the entities of relationships
+            relationships_to_create = []
             for rel in knowledge_graph.relationships:
-                logger.info("Saving relationship: %s", rel.description)
                 source_entity = entity_map.get(rel.source_entity_name)
                 if not source_entity:
                     logger.warning(
@@ -586,11 +693,34 @@ class TiDBGraphStore(GraphStore):
                     )
                     continue
 
+                relationships_to_create.append((rel, source_entity, target_entity))
+
+            # Create relationships
+            relationship_embeddings = self._embedding_model.get_text_embedding_batch(
+                [
+                    self._get_relationship_embedding_str(
+                        source_entity.name,
+                        source_entity.description,
+                        target_entity.name,
+                        target_entity.description,
+                        rel.description,
+                    )
+                    for rel, source_entity, target_entity in relationships_to_create
+                ]
+            )
+            relationships = []
+            for (rel, source_entity, target_entity), embedding in zip(
+                relationships_to_create, relationship_embeddings
+            ):
+                logger.debug("Saving relationship: %s", rel.description)
                 relationship = self.create_relationship(
                     source_entity=source_entity,
                     target_entity=target_entity,
                     description=rel.description,
                     meta=rel.meta,
+                    embedding=embedding,
+                    chunk_id=rel.chunk_id,
+                    document_id=rel.document_id,
                 )
                 relationships.append(relationship)
 
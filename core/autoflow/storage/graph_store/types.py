@@ -87,6 +87,12 @@ class Relationship(BaseModel):
     embedding: Optional[Any] = Field(
         description="Embedding of the relationship", default=None
     )
+    chunk_id: Optional[UUID] = Field(
+        description="The chunk which the relationship belongs to", default=None
+    )
+    document_id: Optional[UUID] = Field(
+        description="The document which the relationship belongs to", default=None
+    )
     created_at: Optional[datetime] = Field(default=None)
     updated_at: Optional[datetime] = Field(default=None)
 
@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+from dspy.utils.dummies import DummyLM
+
+from autoflow.knowledge_graph.programs.cache import (
+    ExtractionCache,
+    SemanticExtractionCache,
+    make_cache_key,
+)
+from autoflow.knowledge_graph.programs.extract_graph import (
+    PROMPT_VERSION,
+    KnowledgeGraphExtractor,
+)
+
+
+class FakeEmbeddingModel:
+    def __init__(self, embeddings: dict):
+        self._embeddings = embeddings
+
+    def get_text_embedding(self, text: str):
+        return self._embeddings[text]
+
+
+KNOWLEDGE = {
+    "entities": [{"name": "TiDB", "description": "A distributed SQL database."}],
+    "relationships": [],
+}
+
+
+def test_make_cache_key():
+    assert make_cache_key("a", "b") == make_cache_key("a", "b")
+    assert make_cache_key("a", "b") != make_cache_key("b", "a")
+    # Parts are length-prefixed, different splits of the same string never collide.
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+
+
+def test_extraction_cache_persistence(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path)
+    cache.put("key", "value")
+    assert cache.get("key") == "value"
+
+    # A new cache instance reads the entries persisted by the previous one.
+    assert ExtractionCache(cache_dir=tmp_path).get("key") == "value"
+
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert ExtractionCache(cache_dir=tmp_path).get("key") is None
+
+
+def test_extraction_cache_max_entries():
+    cache = ExtractionCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    # The least recently used entry is dropped.
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_extractor_evicts_invalid_cached_entry():
+    text = "TiDB is a distributed SQL database."
+    lm = DummyLM([{"knowledge": json.dumps(KNOWLEDGE)}])
+    cache = ExtractionCache()
+    cache_key = make_cache_key(f"{lm.model}:{PROMPT_VERSION}", text)
+    cache.put(cache_key, "not a valid knowledge graph")
+
+    extractor = KnowledgeGraphExtractor(lm, cache=cache)
+    knowledge_graph = extractor.forward(text)
+
+    assert [e.name for e in knowledge_graph.entities] == ["TiDB"]
+    assert json.loads(cache.get(cache_key)) == KNOWLEDGE
+
+
+def test_semantic_cache_similarity_threshold():
+    cache = SemanticExtractionCache(
+        FakeEmbeddingModel(
+            {
+                "origin": [1.0, 0.0],
+                "similar": [0.99, 0.1],
+                "different": [0.5, 0.5],
+            }
+        ),
+        similarity_threshold=0.95,
+    )
+    cache.put(cache.embed("origin"), "ns", "value")
+
+    assert cache.get(cache.embed("similar"), "ns") == "value"
+    assert cache.get(cache.embed("different"), "ns") is None
+
+    cache.delete(cache.embed("origin"), "ns")
+    assert cache.get(cache.embed("origin"), "ns") is None
+
+
+def test_semantic_cache_namespace_isolation():
+    cache = SemanticExtractionCache(FakeEmbeddingModel({"text": [0.0, 1.0]}))
+    embedding = cache.embed("text")
+    cache.put(embedding, "model-a", "a")
+
+    assert cache.get(embedding, "model-a") == "a"
+    assert cache.get(embedding, "model-b") is None
+
+
+def test_semantic_cache_max_entries():
+    embeddings = {str(i): np.eye(4)[i].tolist() for i in range(4)}
+    cache = SemanticExtractionCache(FakeEmbeddingModel(embeddings), max_entries=3)
+    for text in embeddings:
+        cache.put(cache.embed(text), "ns", text)
+
+    # The oldest entry is overwritten.
+    assert cache.get(cache.embed("0"), "ns") is None
+    assert [cache.get(cache.embed(str(i)), "ns") for i in range(1, 4)] == [
+        "1",
+        "2",
+        "3",
+    ]
@@ -1,8 +1,15 @@
+import asyncio
+import json
 import logging
 from pathlib import Path
+import dspy
 import pytest
+from dspy.utils.dummies import DummyLM
 from autoflow.knowledge_graph.programs.eval_graph import KnowledgeGraphEvaluator
-from autoflow.knowledge_graph.programs.extract_graph import KnowledgeGraphExtractor
+from autoflow.knowledge_graph.programs.extract_graph import (
+    KnowledgeGraphExtractor,
+    PredictKnowledgeGraph,
+)
 from autoflow.knowledge_graph.types import GeneratedKnowledgeGraph
 
 from autoflow.models.llms.dspy import get_dspy_lm_by_llm
@@ -109,3 +116,82 @@ def test_extract_graph(extractor, evaluator):
 
     logger.info(f"Final score: {final_score}")
     assert final_score > 0.4, "The completeness score should be greater than 0.4."
+
+
+def test_extract_graph_caps():
+    knowledge = PredictKnowledgeGraph.model_validate(
+        {
+            "entities": [{"name": name, "description": name} for name in "abc"],
+            "relationships": [
+                {"source_entity": s, "target_entity": t, "relationship_desc": "r"}
+                for s, t in [("a", "b"), ("a", "c"), ("c", "b"), ("b", "a")]
+            ],
+        }
+    )
+    extractor = KnowledgeGraphExtractor(DummyLM([]), max_entities=2)
+
+    knowledge_graph = extractor._to_generated_knowledge_graph(knowledge)
+
+    # The relationships of the truncated entity "c" are dropped with it.
+    assert [e.name for e in knowledge_graph.entities] == ["a", "b"]
+    assert [
+        (r.source_entity_name, r.target_entity_name)
+        for r in knowledge_graph.relationships
+    ] == [("a", "b"), ("b", "a")]
+
+
+class SlowAsyncLM(DummyLM):
+    """Records the peak number of the concurrent LLM calls."""
+
+    def __init__(self, answers):
+        super().__init__(answers)
+        self.concurrency = 0
+        self.max_concurrency = 0
+
+    async def acall(self, prompt=None, messages=None, **kwargs):
+        self.concurrency += 1
+        self.max_concurrency = max(self.max_concurrency, self.concurrency)
+        try:
+            await asyncio.sleep(0.05)
+            return self(prompt=prompt, messages=messages, **kwargs)
+        finally:
+            self.concurrency -= 1
+
+
+def test_extract_graph_abatch_concurrency():
+    num_texts = 2 * dspy.settings.async_max_workers
+    knowledge = {
+        "entities": [{"name": "TiDB", "description": "A distributed database."}],
+        "relationships": [],
+    }
+    lm = SlowAsyncLM([{"knowledge": json.dumps(knowledge)}] * num_texts)
+    extractor = KnowledgeGraphExtractor(lm)
+
+    knowledge_graphs = asyncio.run(
+        extractor.abatch([f"text {i}" for i in range(num_texts)], num_texts)
+    )
+
+    assert [kg.entities[0].name for kg in knowledge_graphs] == ["TiDB"] * num_texts
+    # The LLM calls are awaited natively, not capped by DSPy's worker threads.
+    assert lm.max_concurrency == num_texts
+
+
+def test_extract_graph_forward_many_failures():
+    knowledge = {
+        "entities": [{"name": "TiDB", "description": "A distributed database."}],
+        "relationships": [],
+    }
+    # More failures than the default max_errors of DSPy's batching.
+    lm = DummyLM(
+        [{"knowledge": json.dumps(knowledge)}] * 2 + [{"knowledge": "invalid"}] * 13
+    )
+    extractor = KnowledgeGraphExtractor(lm, max_feedback_retries=0)
+
+    knowledge_graphs = extractor.forward_many(
+        [f"text {i}" for i in range(15)], num_threads=1
+    )
+
+    assert [kg.entities[0].name if kg else None for kg in knowledge_graphs] == [
+        "TiDB",
+        "TiDB",
+    ] + [None] * 13
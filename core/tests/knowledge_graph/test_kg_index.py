@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
+
+import pytest
+from dspy.utils.dummies import DummyLM
+
+from autoflow.knowledge_graph.index import KnowledgeGraphIndex, _ProgressLogger
+from autoflow.knowledge_graph.types import GeneratedEntity, GeneratedKnowledgeGraph
+from autoflow.storage.doc_store.types import Chunk
+
+
+class StubKGStore:
+    def __init__(self, existing_chunk_ids=()):
+        self._existing_chunk_ids = set(existing_chunk_ids)
+        self._lock = threading.Lock()
+        self.added = []
+
+    def existing_chunk_ids(self, chunk_ids):
+        return {id for id in chunk_ids if id in self._existing_chunk_ids}
+
+    def add(self, knowledge_graph):
+        with self._lock:
+            self.added.append(knowledge_graph)
+        return knowledge_graph
+
+
+class StubKGExtractor:
+    def __init__(self, block: Optional[threading.Event] = None):
+        self._block = block
+        self._lock = threading.Lock()
+        self.texts: List[str] = []
+
+    def extract(self, text: str) -> GeneratedKnowledgeGraph:
+        with self._lock:
+            self.texts.append(text)
+        if self._block is not None:
+            self._block.wait()
+        return GeneratedKnowledgeGraph(
+            entities=[GeneratedEntity(name=text, description=text, meta={})],
+            relationships=[],
+        )
+
+    async def aextract(self, text: str) -> GeneratedKnowledgeGraph:
+        return self.extract(text)
+
+
+def create_index(kg_store, kg_extractor, **kwargs) -> KnowledgeGraphIndex:
+    index = KnowledgeGraphIndex(
+        kg_store=kg_store, dspy_lm=DummyLM([]), embedding_model=None, **kwargs
+    )
+    index._kg_extractor = kg_extractor
+    return index
+
+
+def test_add_chunks():
+    chunks = [Chunk(text=f"text {i % 3}") for i in range(6)]
+    kg_store = StubKGStore(existing_chunk_ids=[chunks[4].id])
+    kg_extractor = StubKGExtractor()
+    index = create_index(kg_store, kg_extractor)
+
+    results = index.add_chunks(chunks, max_workers=4)
+
+    # The results are in the input order, and the added chunks are skipped.
+    assert [r.entities[0].name if r else None for r in results] == [
+        "text 0",
+        "text 1",
+        "text 2",
+        "text 0",
+        None,
+        "text 2",
+    ]
+    # Chunks with the same text share one extraction, but each chunk is stored.
+    assert sorted(kg_extractor.texts) == ["text 0", "text 1", "text 2"]
+    assert len(kg_store.added) == 5
+
+
+def test_add_chunks_timeout():
+    block = threading.Event()
+    chunks = [Chunk(text=f"text {i}") for i in range(10)]
+    index = create_index(StubKGStore(), StubKGExtractor(block=block))
+
+    try:
+        with pytest.raises(TimeoutError, match="10 chunks"):
+            index.add_chunks(chunks, max_workers=2, timeout=0.1)
+    finally:
+        block.set()
+
+
+def test_collect_results_failure():
+    chunks = [Chunk(text=f"text {i}") for i in range(2)]
+    index = create_index(StubKGStore(), StubKGExtractor())
+    failed, queued = Future(), Future()
+    failed.set_exception(RuntimeError("boom"))
+    pending = {failed: [(0, chunks[0])], queued: [(1, chunks[1])]}
+
+    with pytest.raises(RuntimeError, match="boom"):
+        index._collect_results(pending, [None, None], _ProgressLogger(total=2))
+    # The futures not collected yet are cancelled, like on timeout.
+    assert queued.cancelled()
+
+
+def test_aadd_chunks():
+    chunks = [Chunk(text=f"text {i % 2}") for i in range(4)]
+    kg_store = StubKGStore(existing_chunk_ids=[chunks[0].id])
+    kg_extractor = StubKGExtractor()
+    index = create_index(kg_store, kg_extractor)
+
+    results = asyncio.run(index.aadd_chunks(chunks))
+
+    assert [r.entities[0].name if r else None for r in results] == [
+        None,
+        "text 1",
+        "text 0",
+        "text 1",
+    ]
+    assert sorted(kg_extractor.texts) == ["text 0", "text 1"]
+    assert len(kg_store.added) == 3
@@ -8,6 +8,7 @@ from autoflow.storage.graph_store.types import (
     EntityUpdate,
     RelationshipUpdate,
 )
+from autoflow.utils import uuid6
 
 
 logger = logging.getLogger(__name__)
@@ -213,3 +214,30 @@ def test_entity_degree(graph_store: TiDBGraphStore):
     assert degrees[tiflash_entity.id].degrees == 1
 
     graph_store.reset()
+
+
+def test_existing_chunk_ids(graph_store: TiDBGraphStore):
+    graph_store.reset()
+
+    tidb_entity = graph_store.create_entity(
+        name="TiDB", description="TiDB is a relational database."
+    )
+    tikv_entity = graph_store.create_entity(
+        name="TiKV", description="TiKV is a distributed key-value storage engine."
+    )
+
+    added_chunk_id = uuid6.uuid7()
+    other_chunk_id = uuid6.uuid7()
+    graph_store.create_relationship(
+        source_entity=tidb_entity,
+        target_entity=tikv_entity,
+        description="TiDB uses TiKV as its storage engine.",
+        chunk_id=added_chunk_id,
+    )
+
+    chunk_ids = graph_store.existing_chunk_ids([added_chunk_id, other_chunk_id])
+    assert chunk_ids == {added_chunk_id}
+
+    assert graph_store.existing_chunk_ids([]) == set()
+
+    graph_store.reset()